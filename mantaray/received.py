@@ -75,7 +75,7 @@ def _add_privmsg_to_view(
         for subsubstring, nick_tag in backend.find_nicks(
             substring, view.server_view.core.nick, all_nicks
         ):
-            tags = base_tags.copy()
+            tags = list(base_tags)
             if nick_tag is not None:
                 tags.append(nick_tag)
             parts.append(views.MessagePart(subsubstring, tags=tags))
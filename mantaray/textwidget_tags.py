@@ -1,7 +1,5 @@
 from __future__ import annotations
-import re
 import tkinter
-from functools import partial
 from typing import Callable, Iterator, TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -27,38 +25,97 @@ _MIRC_COLORS = {
     15: "#d2d2d2",
 }
 
+# Indexed by color number
+_FOREGROUND_TAGS = tuple(f"foreground-{number}" for number in _MIRC_COLORS)
+_BACKGROUND_TAGS = tuple(f"background-{number}" for number in _MIRC_COLORS)
+_COLOR_TAG_TABLE = list(zip(_FOREGROUND_TAGS, _BACKGROUND_TAGS, _MIRC_COLORS.values()))
+
 FOREGROUND = _MIRC_COLORS[0]
 BACKGROUND = "#242323"
 
 
-def parse_text(text: str) -> Iterator[tuple[str, list[str]]]:
-    style_regex = r"\x02|\x1f|\x03[0-9]{1,2}(?:,[0-9]{1,2})?|\x0f"
+def _color_number_end(text: str, start: int) -> int:
+    end = start
+    while end < start + 2 and end < len(text) and text[end] in "0123456789":
+        end += 1
+    return end
+
 
-    # parts contains matched parts of the regex followed by texts
-    # between those matched parts
-    parts = [""] + re.split("(" + style_regex + ")", text)
-    assert len(parts) % 2 == 0
+def parse_text(text: str) -> Iterator[tuple[str, tuple[str, ...]]]:
+    # Most messages have no formatting at all. This is faster than comparing
+    # against str.translate(), which copies the text and is slow for non-ASCII.
+    if not ("\x02" in text or "\x03" in text or "\x1f" in text or "\x0f" in text):
+        if text:
+            yield (text, ())
+        return
 
-    fg = None
-    bg = None
+    fg: int | None = None
+    bg: int | None = None
     underline = False
 
-    for style_spec, substring in zip(parts[0::2], parts[1::2]):
-        if not style_spec:
-            # beginning of text
-            pass
-        elif style_spec == "\x02":
+    # The same few styles tend to repeat, so reuse the tag tuples
+    tag_cache: dict[tuple[int | None, int | None, bool], tuple[str, ...]] = {}
+
+    # Replace all control characters with \x02, so that the next one can be
+    # found with one str.find() instead of looping through every character
+    marked_text = text.replace("\x03", "\x02").replace("\x1f", "\x02")
+    marked_text = marked_text.replace("\x0f", "\x02")
+
+    run_start = 0
+    search_start = 0
+    while True:
+        spec_start = marked_text.find("\x02", search_start)
+        if spec_start == -1:
+            # end of text
+            char = ""
+            spec_start = len(text)
+        else:
+            char = text[spec_start]
+            spec_end = spec_start + 1
+            search_start = spec_end
+
+        if char == "\x03":
+            # 1 or 2 digits, optionally followed by a comma and 1 or 2 digits
+            fg_end = _color_number_end(text, spec_end)
+            if fg_end == spec_end:
+                # Not a color code, show it as is
+                continue
+            fg_spec = text[spec_end:fg_end]
+            spec_end = fg_end
+
+            bg_spec: str | None = None
+            if text.startswith(",", fg_end):
+                bg_end = _color_number_end(text, fg_end + 1)
+                if bg_end != fg_end + 1:
+                    bg_spec = text[fg_end + 1 : bg_end]
+                    spec_end = bg_end
+
+        if spec_start != run_start:
+            key = (fg, bg, underline)
+            tags = tag_cache.get(key)
+            if tags is None:
+                tag_list = []
+                if fg is not None:
+                    tag_list.append(_FOREGROUND_TAGS[fg])
+                if bg is not None:
+                    tag_list.append(_BACKGROUND_TAGS[bg])
+                if underline:
+                    tag_list.append("underline")
+                tags = tuple(tag_list)
+                tag_cache[key] = tags
+            yield (text[run_start:spec_start], tags)
+
+        if not char:
+            break
+        run_start = spec_end
+
+        if char == "\x02":
             # Bold not supported, because requires setting custom font in a tag
             # And then the tag's font would need to stay in sync with the main font
             pass
-        elif style_spec == "\x1f":
+        elif char == "\x1f":
             underline = True
-        elif style_spec.startswith("\x03"):
-            # color
-            match = re.fullmatch(r"\x03([0-9]{1,2})(,[0-9]{1,2})?", style_spec)
-            assert match is not None
-            fg_spec, bg_spec = match.groups()
-
+        elif char == "\x03":
             # https://www.mirc.com/colors.html talks about big color numbers:
             # "The way these colors are interpreted varies from client to
             # client. Some map the numbers back to 0 to 15, others interpret
@@ -67,56 +124,95 @@ def parse_text(text: str) -> Iterator[tuple[str, list[str]]]:
             # i'm not sure how exactly the colors should be mapped to the
             # supported range, so i'll just use the default color thing
             fg = int(fg_spec)
-            if fg not in _MIRC_COLORS:
+            if not 0 <= fg <= 15:
                 fg = None
 
             if bg_spec is not None:
-                bg = int(bg_spec.lstrip(","))
-                if bg not in _MIRC_COLORS:
+                bg = int(bg_spec)
+                if not 0 <= bg <= 15:
                     bg = None
-        elif style_spec == "\x0f":
+        else:
+            assert char == "\x0f"
             fg = None
             bg = None
             underline = False
-        else:
-            raise ValueError("unexpected regex match: " + repr(style_spec))
 
-        if substring:
-            tags = []
-            if fg is not None:
-                tags.append("foreground-%d" % fg)
-            if bg is not None:
-                tags.append("background-%d" % bg)
-            if underline:
-                tags.append("underline")
-            yield (substring, tags)
+
+# Tcl 8 uses UTF-16 internally, so e.g. an emoji is 2 characters in text
+# widget indexes. Tcl 9 counts it as 1 character, just like Python.
+_TCL_USES_UTF16 = tkinter.TclVersion < 9
+
+
+def _tcl_length(string: str) -> int:
+    if _TCL_USES_UTF16 and not string.isascii():
+        return len(string.encode("utf-16-le")) // 2
+    return len(string)
 
 
 def find_and_tag_urls(textwidget: tkinter.Text, start: str, end: str) -> None:
-    search_start = start
+    text = textwidget.get(start, end)
+
+    # Compute "line.column" indexes directly, so that Tcl doesn't need to
+    # parse things like "12.34 + 56 chars" for every URL
+    line, column = map(int, textwidget.index(start).split("."))
+    line_start = 0  # where the current line begins in text
+
+    # Looking for "://" with str.find() is much faster than running a regex
+    # over the whole text, and most text contains no URLs at all
+    search_start = 0
     while True:
-        match_start = textwidget.search(
-            r"\mhttps?://[a-z0-9:]", search_start, end, nocase=True, regexp=True
-        )
-        if not match_start:  # empty string means not found
+        separator = text.find("://", search_start)
+        if separator == -1:
             break
+        search_start = separator + 3
+
+        if text[max(0, separator - 5) : separator].lower() == "https":
+            url_start = separator - 5
+        elif text[max(0, separator - 4) : separator].lower() == "http":
+            url_start = separator - 4
+        else:
+            continue
+
+        # Must be at beginning of a word, and have something after "://"
+        if url_start > 0 and (
+            text[url_start - 1].isalnum() or text[url_start - 1] == "_"
+        ):
+            continue
+        first_char = text[search_start : search_start + 1]
+        if not (first_char.isascii() and first_char.isalnum()) and first_char != ":":
+            continue
 
-        url = textwidget.get(match_start, f"{match_start} lineend")
+        # Each find() only searches up to the end of the URL found so far
+        url_end = text.find("\n", search_start)
+        if url_end == -1:
+            url_end = len(text)
+        for terminator in " \t'\"`":
+            index = text.find(terminator, search_start, url_end)
+            if index != -1:
+                url_end = index
 
-        url = url.split(" ")[0]
-        url = url.split("'")[0]
-        url = url.split('"')[0]
-        url = url.split("`")[0]
+        search_start = url_end
 
         # URL, and URL. URL? URL! (also URL). (also URL.)
-        url = url.rstrip(".,?!")
-        if "(" not in url:  # urls can contain spaces (e.g. wikipedia)
-            url = url.rstrip(")")
-        url = url.rstrip(".,?!")
+        if text.find("(", url_start, url_end) == -1:
+            trailing_junk = ".,?!)"
+        else:
+            # urls can contain parentheses (e.g. wikipedia)
+            trailing_junk = ".,?!"
+        while text[url_end - 1] in trailing_junk:
+            url_end -= 1
+        url = text[url_start:url_end]
+
+        newline_count = text.count("\n", line_start, url_start)
+        if newline_count:
+            line += newline_count
+            line_start = text.rindex("\n", line_start, url_start) + 1
+            column = 0
 
-        match_end = f"{match_start} + {len(url)} chars"
-        textwidget.tag_add("url", match_start, match_end)
-        search_start = f"{match_end} + 1 char"
+        # URLs never contain newlines, so the URL ends on the same line
+        start_column = column + _tcl_length(text[line_start:url_start])
+        end_column = start_column + _tcl_length(url)
+        textwidget.tag_add("url", f"{line}.{start_column}", f"{line}.{end_column}")
 
 
 if TYPE_CHECKING:
@@ -145,39 +241,53 @@ def config_tags(
 ) -> None:
     textwidget.config(fg=FOREGROUND, bg=BACKGROUND)
 
-    textwidget.tag_configure("url", underline=True)
-    textwidget.tag_configure("underline", underline=True)
-    textwidget.tag_configure("pinged", foreground="#a1e37b")
-    textwidget.tag_configure("error", foreground="#bd2f2f")
-    textwidget.tag_configure("info", foreground="#FFE6C7")
-    textwidget.tag_configure("history-selection", background="#5a5c50")
-    textwidget.tag_configure("channel", foreground="#f7e452")
-    textwidget.tag_configure("self-nick", foreground="#de8c28", underline=True)
-    textwidget.tag_configure("other-nick", foreground="#e7b678", underline=True)
-    textwidget.tag_configure("received-privmsg", foreground=FOREGROUND)
-    textwidget.tag_configure("sent-privmsg", foreground=FOREGROUND)
+    # Configuring the tags one at a time is a lot of Tcl calls, so build one
+    # Tcl script and run it all at once
+    script = [
+        f"{textwidget} tag configure url -underline 1",
+        f"{textwidget} tag configure underline -underline 1",
+        f"{textwidget} tag configure pinged -foreground #a1e37b",
+        f"{textwidget} tag configure error -foreground #bd2f2f",
+        f"{textwidget} tag configure info -foreground #FFE6C7",
+        f"{textwidget} tag configure history-selection -background #5a5c50",
+        f"{textwidget} tag configure channel -foreground #f7e452",
+        f"{textwidget} tag configure self-nick -foreground #de8c28 -underline 1",
+        f"{textwidget} tag configure other-nick -foreground #e7b678 -underline 1",
+        f"{textwidget} tag configure received-privmsg -foreground {FOREGROUND}",
+        f"{textwidget} tag configure sent-privmsg -foreground {FOREGROUND}",
+    ]
 
     for lower_tag in ["info", "error", "sent-privmsg", "received-privmsg"]:
-        textwidget.tag_lower(lower_tag, "pinged")
+        script.append(f"{textwidget} tag lower {lower_tag} pinged")
     for upper_tag in ["history-selection", "channel", "self-nick", "other-nick"]:
-        textwidget.tag_raise(upper_tag, "pinged")
+        script.append(f"{textwidget} tag raise {upper_tag} pinged")
 
-    for number, hexcolor in _MIRC_COLORS.items():
-        textwidget.tag_configure(f"foreground-{number}", foreground=hexcolor)
-        textwidget.tag_configure(f"background-{number}", background=hexcolor)
-        textwidget.tag_raise(f"foreground-{number}", "sent-privmsg")
-        textwidget.tag_raise(f"background-{number}", "sent-privmsg")
-        textwidget.tag_raise(f"foreground-{number}", "received-privmsg")
-        textwidget.tag_raise(f"background-{number}", "received-privmsg")
+    for fg_tag, bg_tag, hexcolor in _COLOR_TAG_TABLE:
+        script.append(f"{textwidget} tag configure {fg_tag} -foreground {hexcolor}")
+        script.append(f"{textwidget} tag configure {bg_tag} -background {hexcolor}")
+        script.append(f"{textwidget} tag raise {fg_tag} sent-privmsg")
+        script.append(f"{textwidget} tag raise {bg_tag} sent-privmsg")
+        script.append(f"{textwidget} tag raise {fg_tag} received-privmsg")
+        script.append(f"{textwidget} tag raise {bg_tag} received-privmsg")
+
+    textwidget.tk.eval("\n".join(script))
 
     default_cursor = textwidget["cursor"]
-    for tag in ["url", "other-nick"]:
-        textwidget.tag_bind(
-            tag, "<Button-1>", partial(_on_link_clicked, tag, link_click_callback)
-        )
-        textwidget.tag_bind(
-            tag, "<Enter>", (lambda e: textwidget.config(cursor="hand2"))
-        )
-        textwidget.tag_bind(
-            tag, "<Leave>", (lambda e: textwidget.config(cursor=default_cursor))
-        )
+
+    def on_enter(event: tkinter.Event[tkinter.Text]) -> None:
+        textwidget.config(cursor="hand2")
+
+    def on_leave(event: tkinter.Event[tkinter.Text]) -> None:
+        textwidget.config(cursor=default_cursor)
+
+    clickable_tags: list[ClickableTag] = ["url", "other-nick"]
+    for tag in clickable_tags:
+
+        def on_click(
+            event: tkinter.Event[tkinter.Text], tag: ClickableTag = tag
+        ) -> None:
+            _on_link_clicked(tag, link_click_callback, event)
+
+        textwidget.tag_bind(tag, "<Button-1>", on_click)
+        textwidget.tag_bind(tag, "<Enter>", on_enter)
+        textwidget.tag_bind(tag, "<Leave>", on_leave)
@@ -191,6 +191,12 @@ def test_urls(alice, bob, wait_until):
         0, "this is lol https://en.wikipedia.org/wiki/Whitespace_(programming_language)"
     )
     alice.on_enter_pressed()
+    alice.entry.insert(0, "(mixed punctuation at end is http://a.b/c)!)")
+    alice.on_enter_pressed()
+    alice.entry.insert(0, "this url ends at a tab http://x\tfoo")
+    alice.on_enter_pressed()
+    alice.entry.insert(0, "\N{grinning face} emoji before https://example.com/")
+    alice.on_enter_pressed()
     alice.entry.insert(0, "google.com is not a valid URL, it's just a hostname")
     alice.on_enter_pressed()
     alice.entry.insert(0, "last message")
@@ -211,6 +217,9 @@ def test_urls(alice, bob, wait_until):
         "https://stackoverflow.com/",
         "https://stackoverflow.com/",
         "https://en.wikipedia.org/wiki/Whitespace_(programming_language)",
+        "http://a.b/c",
+        "http://x",
+        "https://example.com/",
     ]
 
 